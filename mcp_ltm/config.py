@@ -1,38 +1,195 @@
 """Configuration management for mcp-ltm."""
 
+import copy
+import os
+import re
+from collections.abc import Iterator
+from contextlib import contextmanager
 from pathlib import Path
 
-import yaml
+# Absolute POSIX path or Windows drive path (C:...), never origin:relative
+_FULL_PATH_RE = re.compile(r"^(/|[A-Za-z]:)")
 
+# Below this many origins a linear prefix scan beats walking the trie
+TRIE_MIN_ORIGINS = 8
 
-def default_config() -> dict:
-    """Return a fresh default config (deep copy to avoid mutation issues)."""
-    return {"origins": {}}
+# Entries kept per path conversion cache before it is emptied
+PATH_CACHE_SIZE = 1024
+
+# Parsed config files shared by all Config instances: path -> ((st_mtime_ns, st_size), data)
+_parsed_configs: dict[Path, tuple[tuple[int, int], dict]] = {}
+
+
+class OriginTrie:
+    """Prefix tree over path components, marking nodes that are origin roots."""
+
+    __slots__ = ("children", "origin_name")
+
+    def __init__(self):
+        self.children: dict[str, OriginTrie] = {}
+        self.origin_name: str | None = None
+
+    def add(self, name: str, prefix: str) -> None:
+        """Register an origin by its resolved path prefix (ending in '/')."""
+        node = self
+        for part in prefix[:-1].split("/"):
+            node = node.children.setdefault(part, OriginTrie())
+        node.origin_name = name
+
+    def match(self, full_path: str) -> tuple[str, int] | None:
+        """Find the deepest origin containing full_path.
+
+        Returns (origin_name, prefix_length) so the caller can slice the
+        relative path once, or None if no origin matches.
+        """
+        parts = full_path.split("/")
+        node = self
+        best = None
+        offset = 0
+        # The last component is never an origin root: the relative part must be non-empty
+        for part in parts[:-1]:
+            node = node.children.get(part)
+            if node is None:
+                break
+            offset += len(part) + 1
+            if node.origin_name is not None:
+                best = (node.origin_name, offset)
+        return best
 
 
 class Config:
     def __init__(self, config_path: Path):
         self.config_path = Path(config_path)
-        self._data = self._load()
+        # Loaded lazily on first access and reloaded when the file changes
+        self._loaded: dict | None = None
+        self._signature: tuple[int, int] | None = None
+        self._resolved_origins: list[tuple[str, str]] = []
+        self._origin_trie: OriginTrie | None = None
+        # Prefixes of origins that contain other origins
+        self._outer_prefixes: frozenset[str] = frozenset()
+        # Path conversions that depend only on the origins, memoized until they change
+        self._contract_cache: dict[str, str] = {}
+        self._expand_cache: dict[str, tuple[str, str | None]] = {}
+        # Saves requested inside batch() are deferred until it exits
+        self._batch_depth = 0
+        self._dirty = False
+
+    @property
+    def _data(self) -> dict:
+        """Current config data, reloaded if the file changed on disk.
+
+        Each access stats the file, so public methods read it once.
+        """
+        self._load_if_stale()
+        return self._loaded
+
+    def _file_signature(self) -> tuple[int, int] | None:
+        """Return the config file's (mtime in nanoseconds, size), or None if missing."""
+        try:
+            stat = self.config_path.stat()
+        except FileNotFoundError:
+            return None
+        # The size catches rewrites within one mtime tick on coarse filesystems
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load_if_stale(self) -> None:
+        """Load config unless the cached copy matches the file."""
+        if self._loaded is not None and self._batch_depth:
+            return  # reloading would discard the batch's unsaved changes
+        signature = self._file_signature()
+        if self._loaded is not None and signature == self._signature:
+            return
+        self._loaded = self._load(signature)
+        self._signature = signature
+        self._rebuild_index()
+
+    def _load(self, signature: tuple[int, int] | None) -> dict:
+        """Load config from file, using defaults if missing."""
+        if signature is None:
+            return {"origins": {}}
+
+        cached = _parsed_configs.get(self.config_path)
+        if cached is None or cached[0] != signature:
+            import yaml  # deferred: only needed once a config file exists
 
-    def _load(self) -> dict:
-        """Load config from file, creating with defaults if missing."""
-        if not self.config_path.exists():
-            return default_config()
+            # libyaml-backed C loader when available (much faster than pure Python)
+            loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+            with open(self.config_path) as f:
+                data = yaml.load(f, Loader=loader)
+            if not isinstance(data, dict):
+                data = {}
 
-        with open(self.config_path) as f:
-            data = yaml.safe_load(f) or {}
+            # Keep any other keys; an empty "origins:" entry loads as None
+            result = {**data, "origins": data.get("origins") or {}}
+            cached = (signature, result)
+            _parsed_configs[self.config_path] = cached
 
-        # Merge with defaults
-        result = default_config()
-        result.update(data)
-        return result
+        # Each instance gets its own copy so mutations don't leak between them
+        return copy.deepcopy(cached[1])
+
+    def _rebuild_index(self) -> None:
+        """Precompute resolved origin prefixes, longest first.
+
+        Must be called whenever origins change so contract_path can take the
+        first matching prefix as the best one. Large origin sets also get a
+        trie so lookup cost depends on path depth, not origin count.
+        """
+        # add_origin stores resolved paths, so skip the per-origin stat of resolve();
+        # expanduser is a pure string operation kept for hand-edited configs
+        self._resolved_origins = sorted(
+            (
+                (name, os.path.expanduser(path).rstrip("/") + "/")
+                for name, path in self._loaded.get("origins", {}).items()
+            ),
+            key=lambda item: -len(item[1]),
+        )
+        # A path into one of these may resolve into a nested origin. Paths
+        # starting with a prefix sort right after it, so neighbours suffice.
+        prefixes = sorted({prefix for _, prefix in self._resolved_origins})
+        self._outer_prefixes = frozenset(
+            prefix for prefix, following in zip(prefixes, prefixes[1:]) if following.startswith(prefix)
+        )
+        self._origin_trie = None
+        if len(self._resolved_origins) >= TRIE_MIN_ORIGINS:
+            self._origin_trie = OriginTrie()
+            # Shortest first, so for duplicate paths the origin the scan would pick wins
+            for name, prefix in reversed(self._resolved_origins):
+                self._origin_trie.add(name, prefix)
+        self._contract_cache.clear()
+        self._expand_cache.clear()
+
+    @contextmanager
+    def batch(self) -> Iterator["Config"]:
+        """Coalesce changes into a single save when the outermost batch exits."""
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0 and self._dirty:
+                self.save()
+
+    def _save_if_not_batched(self) -> None:
+        """Save now, or mark dirty if inside a batch."""
+        if self._batch_depth:
+            self._dirty = True
+        else:
+            self.save()
 
     def save(self):
         """Save config to file."""
+        self._dirty = False
         self.config_path.parent.mkdir(parents=True, exist_ok=True)
+        import yaml  # deferred: only needed once a config file exists
+
+        dumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+        # What's in memory is what gets saved: no reload check here
+        data = self._loaded if self._loaded is not None else self._data
         with open(self.config_path, "w") as f:
-            yaml.dump(self._data, f, default_flow_style=False, sort_keys=False)
+            yaml.dump(data, f, Dumper=dumper, default_flow_style=False, sort_keys=False)
+        # Our own write shouldn't trigger a reparse on next access
+        self._signature = self._file_signature()
+        _parsed_configs[self.config_path] = (self._signature, copy.deepcopy(data))
 
     @property
     def origins(self) -> dict[str, str]:
@@ -41,16 +198,21 @@ class Config:
 
     def add_origin(self, name: str, path: str) -> None:
         """Add or update an origin."""
-        if "origins" not in self._data:
-            self._data["origins"] = {}
-        self._data["origins"][name] = str(Path(path).expanduser().resolve())
-        self.save()
+        origins = self._data.setdefault("origins", {})
+        resolved = str(Path(path).expanduser().resolve())
+        if origins.get(name) == resolved:
+            return  # already configured: no index rebuild or file rewrite
+        origins[name] = resolved
+        self._rebuild_index()
+        self._save_if_not_batched()
 
     def remove_origin(self, name: str) -> bool:
         """Remove an origin. Returns True if it existed."""
-        if name in self._data.get("origins", {}):
-            del self._data["origins"][name]
-            self.save()
+        origins = self._data.get("origins", {})
+        if name in origins:
+            del origins[name]
+            self._rebuild_index()
+            self._save_if_not_batched()
             return True
         return False
 
@@ -59,40 +221,87 @@ class Config:
 
         Returns the shortest representation (prefers origins over full paths).
         """
-        full_path = str(Path(full_path).expanduser().resolve())
+        self._load_if_stale()
+        contracted = self._contract_cache.get(full_path)
+        if contracted is None:
+            contracted = self._contract_path(full_path)
+        return contracted
 
-        best_origin = None
-        best_relative = None
+    def _contract_path(self, full_path: str) -> str:
+        if full_path.startswith("/") and "~" not in full_path and "/.." not in full_path:
+            # Already absolute: try a lexical cleanup first, which avoids the
+            # realpath() syscalls whenever it matches an innermost origin.
+            # Under an origin with nested ones, a symlink could lead into a
+            # deeper origin, so those paths are resolved.
+            normalized = os.path.normpath(full_path)
+            match = self._match_origin(normalized)
+            if match is not None and normalized[:match[1]] not in self._outer_prefixes:
+                contracted = _join_origin(normalized, match)
+                # Only these results are cached: realpath() ones also depend
+                # on symlinks, which can change without the origins changing
+                _cache_put(self._contract_cache, full_path, contracted)
+                return contracted
 
-        for name, origin_path in self.origins.items():
-            origin_path = str(Path(origin_path).resolve())
-            if full_path.startswith(origin_path + "/"):
-                relative = full_path[len(origin_path) + 1:]
-                if best_relative is None or len(relative) < len(best_relative):
-                    best_origin = name
-                    best_relative = relative
+        # Origins are stored resolved, so symlinks in the path (e.g. /var
+        # on macOS) have to be resolved before matching.
+        # os.path avoids pathlib's object construction on this hot path.
+        full_path = os.path.realpath(os.path.expanduser(full_path))
+        match = self._match_origin(full_path)
+        if match is None:
+            return full_path
+        return _join_origin(full_path, match)
 
-        if best_origin:
-            return f"{best_origin}:{best_relative}"
-        return full_path
+    def _match_origin(self, full_path: str) -> tuple[str, int] | None:
+        """Find the most specific origin for a normalized path.
+
+        Returns (origin_name, prefix_length) or None if no origin matches.
+        """
+        if self._origin_trie is not None:
+            return self._origin_trie.match(full_path)
+
+        # Sorted longest prefix first, so the first match is the best origin
+        for name, prefix in self._resolved_origins:
+            if full_path.startswith(prefix):
+                return name, len(prefix)
+        return None
 
     def expand_path(self, path: str) -> tuple[str, str | None]:
         """Expand an origin:relative path to full path.
 
         Returns (expanded_path, warning) where warning is set if origin not found.
         """
-        if ":" not in path or path.startswith("/"):
-            # Already a full path or no origin prefix
+        if ":" not in path or _FULL_PATH_RE.match(path):
+            # No origin prefix, or already a full (POSIX or Windows) path;
+            # this doesn't depend on origins, so skip the reload check and cache
             return path, None
 
-        # Check if it looks like a Windows path (C:\...)
-        if len(path) > 1 and path[1] == ":" and path[0].isalpha():
-            return path, None
+        self._load_if_stale()
+        expanded = self._expand_cache.get(path)
+        if expanded is None:
+            expanded = self._expand_path(path)
+            _cache_put(self._expand_cache, path, expanded)
+        return expanded
 
+    def _expand_path(self, path: str) -> tuple[str, str | None]:
         origin_name, relative = path.split(":", 1)
 
-        if origin_name not in self.origins:
+        origins = self._loaded.get("origins", {})
+        if origin_name not in origins:
             return path, f"Unknown origin '{origin_name}'. Use list_origins to see available origins."
 
-        origin_path = self.origins[origin_name]
-        return str(Path(origin_path) / relative), None
+        origin_path = origins[origin_name]
+        return os.path.join(origin_path, relative), None
+
+
+def _join_origin(full_path: str, match: tuple[str, int]) -> str:
+    """Build origin:relative for a path and its matching (origin_name, prefix_length)."""
+    # Slice the relative part once, only for the winning origin
+    name, prefix_len = match
+    return f"{name}:{full_path[prefix_len:]}"
+
+
+def _cache_put(cache: dict, key, value) -> None:
+    """Add a path conversion, emptying the cache first when it is full."""
+    if len(cache) >= PATH_CACHE_SIZE:
+        cache.clear()
+    cache[key] = value
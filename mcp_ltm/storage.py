@@ -2,22 +2,105 @@
 
 from __future__ import annotations
 
+import functools
+import itertools
+import json
+import os
 import re
 import sqlite3
-from dataclasses import dataclass
-from datetime import datetime, timezone
+import threading
+from collections import OrderedDict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from typing import TYPE_CHECKING
 
-import yaml
-
 if TYPE_CHECKING:
     from .config import Config
 
 
 # Valid memory ID: word characters (letters, digits, underscores) and hyphens
 # Uses \w to match Unicode letters for backwards compatibility with slugify
-MEMORY_ID_PATTERN = re.compile(r"^[\w-]+$")
+# Anchored with \A...\Z: "$" would also accept a trailing newline
+MEMORY_ID_PATTERN = re.compile(r"\A[\w-]+\Z")
+
+# Patterns used on hot paths (slugify/normalize_tag run for every title and tag)
+_PUNCT_RE = re.compile(r"[^\w\s-]")
+_SPACE_RE = re.compile(r"[-\s]+")
+_TAG_PUNCT_RE = re.compile(r"[^\w\s:-]")
+_TAG_SPACE_RE = re.compile(r"\s+")
+_H1_RE = re.compile(r"^#\s+.*\n+")
+
+
+# Parsed memory files kept in memory, most recently read last. Each entry holds
+# the whole content, so this bounds the cache's size for large stores.
+PARSE_CACHE_SIZE = 256
+
+# Applied to every connection (these settings don't persist in the database file).
+# foreign_keys must be on for the schema's ON DELETE CASCADE clauses to fire.
+CONNECTION_PRAGMAS = (
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA synchronous=NORMAL",  # with WAL, commits append to the log without fsync
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-20000",  # ~20 MB page cache
+    "PRAGMA mmap_size=268435456",  # 256 MB
+)
+
+
+# Stored in PRAGMA user_version once SCHEMA and the migrations have been applied.
+# Bump it whenever either of them changes.
+SCHEMA_VERSION = 2
+
+# Run one by one inside a single transaction; executescript() would commit
+# first and then run every statement in autocommit mode
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS memories (
+        id TEXT PRIMARY KEY,
+        title TEXT,
+        summary TEXT,
+        source TEXT,
+        created_at TEXT,
+        accessed_at TEXT,
+        access_count INTEGER DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS memory_tags (
+        memory_id TEXT,
+        tag TEXT,
+        PRIMARY KEY (memory_id, tag),
+        FOREIGN KEY (memory_id) REFERENCES memories(id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS memory_links (
+        from_id TEXT,
+        to_id TEXT,
+        PRIMARY KEY (from_id, to_id),
+        FOREIGN KEY (from_id) REFERENCES memories(id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS tag_cooccurrence (
+        tag1 TEXT,
+        tag2 TEXT,
+        count INTEGER DEFAULT 1,
+        PRIMARY KEY (tag1, tag2)
+    )
+    """,
+    # Covering index: tag lookups get memory_id without touching the table.
+    # Replaces the older single-column idx_tags.
+    "DROP INDEX IF EXISTS idx_tags",
+    "CREATE INDEX IF NOT EXISTS idx_tags_memory ON memory_tags(tag, memory_id)",
+    "CREATE INDEX IF NOT EXISTS idx_memories_accessed ON memories(accessed_at DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_memories_created ON memories(created_at)",
+    # tag1 lookups use the primary key's index; a separate one only slowed writes
+    "DROP INDEX IF EXISTS idx_cooccurrence",
+    "CREATE INDEX IF NOT EXISTS idx_cooccurrence_tag2 ON tag_cooccurrence(tag2)",
+)
 
 
 class InvalidMemoryId(ValueError):
@@ -26,7 +109,7 @@ class InvalidMemoryId(ValueError):
     pass
 
 
-@dataclass
+@dataclass(slots=True)
 class Memory:
     id: str
     title: str
@@ -43,38 +126,272 @@ class Memory:
 def slugify(text: str) -> str:
     """Convert text to a URL-friendly slug."""
     text = text.lower()
-    text = re.sub(r"[''`]", "", text)  # remove apostrophes
-    text = re.sub(r"[^\w\s-]", " ", text)  # replace punctuation with space
-    text = re.sub(r"[-\s]+", "-", text)  # collapse spaces/hyphens
+    text = text.replace("'", "").replace("`", "")  # remove apostrophes
+    text = _PUNCT_RE.sub(" ", text)  # replace punctuation with space
+    text = _SPACE_RE.sub("-", text)  # collapse spaces/hyphens
     text = text.strip("-")
     return text
 
 
+# Characters besides letters and digits that survive normalization unchanged
+_TAG_SAFE_CHARS = frozenset("-:_")
+
+
+@functools.lru_cache(maxsize=4096)
 def normalize_tag(tag: str) -> str:
     """Normalize a tag: lowercase, hyphens for spaces, strip punctuation."""
+    # Fast path: most tags arrive already normalized
+    if tag.islower() and all(c.isalnum() or c in _TAG_SAFE_CHARS for c in tag):
+        return tag
     tag = tag.lower().strip()
-    tag = re.sub(r"[^\w\s:-]", "", tag)  # keep colons for namespacing
-    tag = re.sub(r"\s+", "-", tag)
+    tag = _TAG_PUNCT_RE.sub("", tag)  # keep colons for namespacing
+    tag = _TAG_SPACE_RE.sub("-", tag)
     return tag
 
 
+def normalize_tags(tags: list[str]) -> list[str]:
+    """Normalize tags and drop duplicates, keeping first-seen order."""
+    return list(dict.fromkeys(normalize_tag(t) for t in tags))
+
+
+def split_frontmatter(content: str) -> tuple[str | None, str]:
+    """Split markdown content into raw frontmatter text and body.
+
+    Returns None for the frontmatter if the content doesn't have any.
+    """
+    if not content.startswith("---\n"):
+        return None, content
+
+    # Locate the closing delimiter instead of splitting, so the body is only
+    # copied once
+    end = content.find("\n---", 3)
+    if end < 0:
+        return None, content
+
+    return content[4:end], content[end + 4:].lstrip("\n")
+
+
+# Shapes yaml.dump() produces for memory frontmatter, see _parse_simple_yaml()
+_YAML_KEY_RE = re.compile(r"([A-Za-z_]\w*):(?: (.*))?")
+_YAML_INT_RE = re.compile(r"0|[1-9][0-9]*")
+_YAML_PLAIN_RE = re.compile(r"[A-Za-z_/][\w./:@ -]*")
+_YAML_WORDS = frozenset({"y", "n", "yes", "no", "on", "off", "true", "false", "null"})
+_UNPARSED = object()
+
+
+def _parse_simple_scalar(value: str):
+    """Parse a scalar as YAML would, or return _UNPARSED if unsure."""
+    if value.startswith("'"):
+        inner = value[1:-1]
+        if len(value) > 1 and value.endswith("'") and "'" not in inner.replace("''", ""):
+            return inner.replace("''", "'")
+        return _UNPARSED
+    if value == "[]":
+        return []
+    if _YAML_INT_RE.fullmatch(value):
+        return int(value)
+    if (_YAML_PLAIN_RE.fullmatch(value) and value.lower() not in _YAML_WORDS
+            and ": " not in value and not value.endswith((" ", ":"))):
+        return value
+    return _UNPARSED
+
+
+def _fold_lines(lines: list[str]) -> str:
+    """Join a scalar wrapped over several lines the way YAML folds it."""
+    if len(lines) == 1:
+        return lines[0]
+    last = len(lines) - 1
+    folded = lines[0].rstrip(" ")
+    breaks = 0
+    for i, line in enumerate(lines[1:], 1):
+        line = line.lstrip(" ") if i == last else line.strip(" ")
+        if not line:
+            breaks += 1
+            continue
+        folded += "\n" * breaks if breaks else " "
+        folded += line
+        breaks = 0
+    return folded
+
+
+def _parse_simple_yaml(text: str) -> dict | None:
+    """Parse the flat mapping yaml.dump() writes for a memory.
+
+    Handles top-level keys with plain, single-quoted or integer scalars
+    (including ones wrapped over several lines) and block lists of them.
+    Returns None for anything else (double quotes, nesting, comments), so the
+    caller can use PyYAML.
+    """
+    if "\t" in text:
+        return None  # tabs have their own rules around indentation and folding
+
+    # Group each key or list item line with its continuation lines
+    entries = []
+    for line in text.split("\n"):
+        if not line or line.startswith(" "):
+            if not entries:
+                return None
+            entries[-1].append(line)
+        else:
+            entries.append([line])
+
+    result = {}
+    list_key = None  # key whose "- item" lines are being read
+    for first, *rest in entries:
+        if first.startswith("- ") and list_key is not None:
+            item = _parse_simple_scalar(_fold_lines([first[2:], *rest]))
+            if item is _UNPARSED:
+                return None
+            if result[list_key] is None:
+                result[list_key] = []
+            result[list_key].append(item)
+            continue
+
+        match = _YAML_KEY_RE.fullmatch(first)
+        if not match:
+            return None
+        key, value = match.groups()
+        if key.lower() in _YAML_WORDS:
+            return None  # would load as a bool or null key
+        if value is None:
+            if any(rest):
+                return None  # indented block: nested structure
+            # Block list follows, or nothing (null)
+            list_key = key
+            result[key] = None
+        else:
+            list_key = None
+            value = _parse_simple_scalar(_fold_lines([value, *rest]))
+            if value is _UNPARSED:
+                return None
+            result[key] = value
+    return result
+
+
 def parse_frontmatter(content: str) -> tuple[dict, str]:
     """Parse YAML frontmatter from markdown content."""
-    if not content.startswith("---"):
+    raw, body = split_frontmatter(content)
+    if raw is None:
         return {}, content
 
-    parts = content.split("---", 2)
-    if len(parts) < 3:
-        return {}, content
+    # Memory files are written by yaml.dump(), whose output almost always
+    # fits the simple parser; PyYAML handles the rest
+    frontmatter = _parse_simple_yaml(raw)
+    if frontmatter is None:
+        import yaml  # deferred so server startup doesn't pay for PyYAML
 
-    frontmatter = yaml.safe_load(parts[1]) or {}
-    body = parts[2].lstrip("\n")
+        # libyaml-backed C loader when available, 3-10x faster than pure Python
+        loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+        try:
+            frontmatter = yaml.load(raw, Loader=loader) or {}
+        except yaml.YAMLError as e:
+            raise ValueError(f"Invalid frontmatter: {e}") from e
+        if not isinstance(frontmatter, dict):
+            raise ValueError("Invalid frontmatter: not a mapping")
     return frontmatter, body
 
 
+# Keys every memory file's frontmatter has; other markdown files aren't indexed
+MEMORY_KEYS = ("id", "title", "created_at")
+
+
+def _is_memory_frontmatter(frontmatter: dict) -> bool:
+    """Check that frontmatter has a memory's keys and lists of strings for tags and links."""
+    if not all(key in frontmatter for key in MEMORY_KEYS):
+        return False
+    for key in ("tags", "links"):
+        items = frontmatter.get(key) or []
+        if not isinstance(items, list) or not all(isinstance(item, str) for item in items):
+            return False
+    return True
+
+
+def _parse_timestamp(value) -> datetime:
+    """Parse a frontmatter timestamp, raising ValueError if it isn't one."""
+    if isinstance(value, datetime):
+        return value  # unquoted, so PyYAML already parsed it
+    if not isinstance(value, str):
+        raise ValueError(f"Invalid timestamp: {value!r}")
+    return datetime.fromisoformat(value)
+
+
+def _utc_isoformat(value: datetime) -> str:
+    """Format a timestamp for the index, where they're compared as strings.
+
+    Converted to UTC so every stored timestamp has the same offset; ones
+    without an offset are taken as UTC already.
+    """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat()
+
+
+def _memory_from_frontmatter(frontmatter: dict, body: str, memory_id: str) -> Memory:
+    """Build a Memory from a parsed file, with stats as recorded in its frontmatter."""
+    # Remove the H1 title from body if present
+    body = _H1_RE.sub("", body)
+
+    now = datetime.now(timezone.utc)
+    return Memory(
+        id=frontmatter.get("id", memory_id),
+        title=frontmatter.get("title", ""),
+        # An empty "tags:" or "links:" entry loads as None
+        tags=frontmatter.get("tags") or [],
+        summary=frontmatter.get("summary", ""),
+        content=body.strip(),
+        created_at=_parse_timestamp(frontmatter.get("created_at", now)),
+        accessed_at=_parse_timestamp(frontmatter.get("accessed_at", now)),
+        access_count=frontmatter.get("access_count", 0),
+        links=frontmatter.get("links") or [],
+        source=frontmatter.get("source"),
+    )
+
+
+def _render_simple_scalar(value) -> str | None:
+    """Render a scalar that _parse_simple_scalar() reads back, or None."""
+    if type(value) is int:
+        return str(value)
+    if not isinstance(value, str):
+        return None
+    if _parse_simple_scalar(value) == value:
+        return value  # plain
+    if value.isprintable():
+        return "'" + value.replace("'", "''") + "'"
+    return None  # needs escapes: leave it to PyYAML
+
+
+def _render_simple_yaml(key: str, value) -> str | None:
+    """Render one frontmatter entry without PyYAML, or None if it can't."""
+    if not (key.isascii() and key.isidentifier()) or key.lower() in _YAML_WORDS:
+        return None
+    if isinstance(value, list):
+        if not value:
+            return f"{key}: []\n"
+        items = [_render_simple_scalar(item) for item in value]
+        if None in items:
+            return None
+        return f"{key}:\n" + "".join(f"- {item}\n" for item in items)
+    scalar = _render_simple_scalar(value)
+    return None if scalar is None else f"{key}: {scalar}\n"
+
+
+def _render_yaml_entry(key: str, value) -> str:
+    """Render one frontmatter entry as YAML, ending with a newline."""
+    # Entries of the usual shapes are formatted directly; PyYAML is only
+    # used for values that need escaping or nesting
+    entry = _render_simple_yaml(key, value)
+    if entry is None:
+        import yaml  # deferred so server startup doesn't pay for PyYAML
+
+        dumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+        entry = yaml.dump({key: value}, Dumper=dumper, default_flow_style=False, sort_keys=False)
+    return entry
+
+
 def render_frontmatter(metadata: dict) -> str:
     """Render metadata as YAML frontmatter."""
-    return "---\n" + yaml.dump(metadata, default_flow_style=False, sort_keys=False) + "---\n\n"
+    entries = "".join(_render_yaml_entry(key, value) for key, value in metadata.items())
+    return f"---\n{entries}---\n\n"
 
 
 class MemoryStorage:
@@ -83,57 +400,102 @@ class MemoryStorage:
         self.base_path.mkdir(parents=True, exist_ok=True)
         self.db_path = self.base_path / "index.db"
         self.config = config
+        # One connection for the lifetime of the storage; the lock serializes
+        # access to it (SQLite allows a single writer per database anyway)
+        self._lock = threading.RLock()
+        self._conn = self._connect()
+        # Parsed markdown files, least recently read first: memory_id -> (mtime_ns, size, Memory)
+        self._parse_cache: OrderedDict[str, tuple[int, int, Memory]] = OrderedDict()
+        # Memories whose frontmatter stats are behind the index's
+        self._stale_stats: set[str] = set()
+        # IDs of the markdown files the last rebuild_index() couldn't index
+        self.skipped_files: list[str] = []
         self._init_db()
 
+        with self._locked() as conn:
+            indexed = conn.execute("SELECT 1 FROM memories LIMIT 1").fetchone()
+        if not indexed and next(self._memory_file_ids(), None):
+            # New or deleted index next to existing files: rebuild it from them
+            self.rebuild_index()
+
     def _connect(self) -> sqlite3.Connection:
-        """Create a database connection with foreign keys enabled."""
-        conn = sqlite3.connect(self.db_path)
-        conn.execute("PRAGMA foreign_keys=ON")
+        """Create a database connection with foreign keys and tuning pragmas.
+
+        The connection runs in autocommit mode; writes use explicit
+        transactions via _transaction().
+        """
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
         return conn
 
+    def close(self):
+        """Flush access stats to the markdown files and close the database connection.
+
+        The frontmatter copies are what rebuild_index() restores the stats from;
+        only the files of memories accessed since their last write are rewritten.
+        """
+        with self._lock:
+            self.flush_stats_to_markdown()
+            self._conn.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run a block as a single write transaction on the shared connection."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    @contextmanager
+    def _locked(self) -> Iterator[sqlite3.Connection]:
+        """Use the shared connection in autocommit mode (reads, schema setup)."""
+        with self._lock:
+            yield self._conn
+
     def _init_db(self):
         """Initialize SQLite database schema."""
-        with self._connect() as conn:
-            conn.executescript("""
-                CREATE TABLE IF NOT EXISTS memories (
-                    id TEXT PRIMARY KEY,
-                    title TEXT,
-                    summary TEXT,
-                    source TEXT,
-                    created_at TEXT,
-                    accessed_at TEXT,
-                    access_count INTEGER DEFAULT 0
-                );
-
-                CREATE TABLE IF NOT EXISTS memory_tags (
-                    memory_id TEXT,
-                    tag TEXT,
-                    PRIMARY KEY (memory_id, tag),
-                    FOREIGN KEY (memory_id) REFERENCES memories(id) ON DELETE CASCADE
-                );
-
-                CREATE TABLE IF NOT EXISTS memory_links (
-                    from_id TEXT,
-                    to_id TEXT,
-                    PRIMARY KEY (from_id, to_id),
-                    FOREIGN KEY (from_id) REFERENCES memories(id) ON DELETE CASCADE
-                );
-
-                CREATE TABLE IF NOT EXISTS tag_cooccurrence (
-                    tag1 TEXT,
-                    tag2 TEXT,
-                    count INTEGER DEFAULT 1,
-                    PRIMARY KEY (tag1, tag2)
-                );
-
-                CREATE INDEX IF NOT EXISTS idx_tags ON memory_tags(tag);
-                CREATE INDEX IF NOT EXISTS idx_cooccurrence ON tag_cooccurrence(tag1);
-            """)
+        with self._locked() as conn:
+            # WAL is persistent on the database file; setting it again is a no-op.
+            # journal_mode can't be changed inside a transaction.
+            conn.execute("PRAGMA journal_mode=WAL")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+
+        if version >= SCHEMA_VERSION:
+            return  # up to date, nothing to run on startup
+
+        # Schema setup and migrations commit together, in one write transaction.
+        # Every step is idempotent, so a concurrent upgrade is harmless.
+        with self._transaction() as conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+
             # Add source column if missing (migration for existing DBs)
-            try:
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(memories)")}
+            if "source" not in columns:
                 conn.execute("ALTER TABLE memories ADD COLUMN source TEXT")
-            except sqlite3.OperationalError:
-                pass  # Column already exists
+
+            # Timestamps are stored in UTC (version 2); rebuilds used to keep
+            # the offsets from the files
+            rows = conn.execute("""
+                SELECT id, created_at, accessed_at FROM memories
+                WHERE created_at NOT LIKE '%+00:00' OR accessed_at NOT LIKE '%+00:00'
+            """).fetchall()
+            conn.executemany(
+                "UPDATE memories SET created_at = ?, accessed_at = ? WHERE id = ?",
+                [
+                    (_utc_isoformat(datetime.fromisoformat(row["created_at"])),
+                     _utc_isoformat(datetime.fromisoformat(row["accessed_at"])), row["id"])
+                    for row in rows
+                ],
+            )
+
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
 
     def _contract_source(self, source: str | None) -> str | None:
         """Contract a source path using origins if available."""
@@ -157,9 +519,19 @@ class MemoryStorage:
         if not base_slug:
             base_slug = "memory"
 
+        # Fetch the base slug and all "<base>-..." IDs in one indexed range scan
+        # ('.' sorts right after '-') instead of a stat() per taken suffix
+        with self._locked() as conn:
+            rows = conn.execute(
+                "SELECT id FROM memories WHERE id = ? OR (id >= ? AND id < ?)",
+                (base_slug, f"{base_slug}-", f"{base_slug}."),
+            ).fetchall()
+        taken = {row["id"] for row in rows}
+
         slug = base_slug
         counter = 1
-        while (self.base_path / f"{slug}.md").exists():
+        # The file check still catches markdown files the index doesn't know about
+        while slug in taken or (self.base_path / f"{slug}.md").exists():
             counter += 1
             slug = f"{base_slug}-{counter}"
         return slug
@@ -181,7 +553,10 @@ class MemoryStorage:
 
         Raises InvalidMemoryId if the ID contains invalid characters.
         """
-        if not MEMORY_ID_PATTERN.match(memory_id):
+        # Fast path: slugify() IDs pass a single C-level scan, without the regex
+        if memory_id.replace("-", "").replace("_", "").isalnum():
+            return self.base_path / f"{memory_id}.md"
+        if not MEMORY_ID_PATTERN.fullmatch(memory_id):
             raise InvalidMemoryId(
                 f"Invalid memory ID: {memory_id!r}. "
                 "Must contain only letters, digits, hyphens, and underscores."
@@ -191,29 +566,32 @@ class MemoryStorage:
     def _save_tags(self, conn: sqlite3.Connection, memory_id: str, tags: list[str]):
         """Save tags for a memory, replacing any existing tags."""
         conn.execute("DELETE FROM memory_tags WHERE memory_id = ?", (memory_id,))
-        for tag in tags:
-            conn.execute("INSERT INTO memory_tags (memory_id, tag) VALUES (?, ?)", (memory_id, tag))
+        conn.executemany(
+            "INSERT INTO memory_tags (memory_id, tag) VALUES (?, ?)",
+            [(memory_id, tag) for tag in tags],
+        )
 
     def _save_links(self, conn: sqlite3.Connection, memory_id: str, links: list[str]):
         """Save links for a memory, replacing any existing links."""
         conn.execute("DELETE FROM memory_links WHERE from_id = ?", (memory_id,))
-        for link in links:
-            conn.execute("INSERT OR IGNORE INTO memory_links (from_id, to_id) VALUES (?, ?)", (memory_id, link))
+        conn.executemany(
+            "INSERT OR IGNORE INTO memory_links (from_id, to_id) VALUES (?, ?)",
+            [(memory_id, link) for link in links],
+        )
 
     def _find_suggested_links(self, conn: sqlite3.Connection, tags: list[str],
                               exclude_id: str, limit: int = 5) -> list[str]:
         """Find memories with highest tag overlap, excluding the given ID."""
         if not tags:
             return []
-        placeholders = ",".join("?" * len(tags))
-        rows = conn.execute(f"""
+        rows = conn.execute("""
             SELECT memory_id, COUNT(*) as overlap
             FROM memory_tags
-            WHERE tag IN ({placeholders}) AND memory_id != ?
+            WHERE tag IN (SELECT value FROM json_each(?)) AND memory_id != ?
             GROUP BY memory_id
             ORDER BY overlap DESC
             LIMIT ?
-        """, (*tags, exclude_id, limit)).fetchall()
+        """, (json.dumps(tags), exclude_id, limit)).fetchall()
         return [row[0] for row in rows]
 
     def _insert_memory(self, conn: sqlite3.Connection, memory: Memory):
@@ -222,15 +600,28 @@ class MemoryStorage:
             INSERT INTO memories (id, title, summary, source, created_at, accessed_at, access_count)
             VALUES (?, ?, ?, ?, ?, ?, ?)
         """, (memory.id, memory.title, memory.summary, memory.source,
-              memory.created_at.isoformat(), memory.accessed_at.isoformat(), memory.access_count))
-
-    def _row_to_result(self, row: sqlite3.Row, include_content: bool = False) -> dict:
+              _utc_isoformat(memory.created_at), _utc_isoformat(memory.accessed_at), memory.access_count))
+
+    def _fetch_tags(self, conn: sqlite3.Connection, memory_ids: list[str]) -> dict[str, list[str]]:
+        """Fetch tags for several memories in one query, in the order they were saved."""
+        tags_by_id = {memory_id: [] for memory_id in memory_ids}
+        if memory_ids:
+            rows = conn.execute("""
+                SELECT memory_id, tag FROM memory_tags
+                WHERE memory_id IN (SELECT value FROM json_each(?))
+                ORDER BY rowid
+            """, (json.dumps(memory_ids),))
+            for memory_id, tag in rows:
+                tags_by_id[memory_id].append(tag)
+        return tags_by_id
+
+    def _row_to_result(self, row: sqlite3.Row, tags: list[str], include_content: bool = False) -> dict:
         """Convert a database row to a result dictionary."""
         result = {
             "id": row["id"],
             "title": row["title"],
             "summary": row["summary"],
-            "tags": row["tags_str"].split(",") if row["tags_str"] else [],
+            "tags": tags,
             "created_at": row["created_at"],
         }
         if row["source"]:
@@ -247,23 +638,20 @@ class MemoryStorage:
 
     def _update_cooccurrence(self, conn: sqlite3.Connection, tags: list[str], delta: int = 1):
         """Update tag co-occurrence counts."""
-        for i, tag1 in enumerate(tags):
-            for tag2 in tags[i + 1:]:
-                t1, t2 = sorted([tag1, tag2])
-                if delta > 0:
-                    conn.execute("""
-                        INSERT INTO tag_cooccurrence (tag1, tag2, count)
-                        VALUES (?, ?, ?)
-                        ON CONFLICT(tag1, tag2) DO UPDATE SET count = count + ?
-                    """, (t1, t2, delta, delta))
-                else:
-                    conn.execute("""
-                        UPDATE tag_cooccurrence SET count = count + ?
-                        WHERE tag1 = ? AND tag2 = ?
-                    """, (delta, t1, t2))
-
-        # Clean up rows with zero or negative counts
-        if delta < 0:
+        pairs = [(*sorted(pair), delta) for pair in itertools.combinations(tags, 2)]
+        if delta > 0:
+            conn.executemany("""
+                INSERT INTO tag_cooccurrence (tag1, tag2, count)
+                VALUES (?, ?, ?)
+                ON CONFLICT(tag1, tag2) DO UPDATE SET count = count + excluded.count
+            """, pairs)
+        else:
+            conn.executemany("""
+                UPDATE tag_cooccurrence SET count = count + ?
+                WHERE tag1 = ? AND tag2 = ?
+            """, [(d, t1, t2) for t1, t2, d in pairs])
+
+            # Clean up rows with zero or negative counts
             conn.execute("DELETE FROM tag_cooccurrence WHERE count <= 0")
 
     def _write_markdown(self, memory: Memory):
@@ -281,37 +669,107 @@ class MemoryStorage:
         if memory.source:
             metadata["source"] = memory.source
 
-        content = render_frontmatter(metadata)
-        content += f"# {memory.title}\n\n"
-        content += memory.content
+        # The header and body are written separately so the body isn't copied
+        # into a new string
+        heading = f"# {memory.title}\n\n"
+        self._replace_file(memory.id, render_frontmatter(metadata), heading, memory.content)
+        self._stale_stats.discard(memory.id)
+
+        # Cache the memory as it will parse back, so the next get() or update()
+        # doesn't read the file it was just built from
+        stat = (self.base_path / f"{memory.id}.md").stat()
+        metadata.update(tags=list(memory.tags), links=list(memory.links))
+        self._cache_parsed(memory.id, stat, _memory_from_frontmatter(metadata, heading + memory.content, memory.id))
+
+    def _replace_file(self, memory_id: str, *parts: str):
+        """Replace a memory file with the concatenation of parts."""
+        # Write to a temp file and rename so readers never see a partial file.
+        # The buffer makes it one write(2) for files under 64 KiB.
+        file_path = self.base_path / f"{memory_id}.md"
+        tmp_path = file_path.with_suffix(".md.tmp")
+        with open(tmp_path, "w", buffering=1 << 16) as f:
+            for part in parts:
+                f.write(part)
+        os.replace(tmp_path, file_path)
+        self._parse_cache.pop(memory_id, None)
+
+    def _rewrite_source_line(self, memory_id: str, source: str) -> bool:
+        """Replace the source line in a memory file, leaving the rest as is.
+
+        Returns False if the file has no single-line source entry to replace.
+        """
+        file_path = self._resolve_memory_path(memory_id)
+        try:
+            content = file_path.read_text()
+        except FileNotFoundError:
+            return False
+        raw, _ = split_frontmatter(content)
+        if raw is None:
+            return False
 
-        file_path = self.base_path / f"{memory.id}.md"
-        file_path.write_text(content)
+        frontmatter_end = 4 + len(raw)
+        start = content.find("\nsource: ", 3, frontmatter_end) + 1
+        if not start:
+            return False
+        end = content.find("\n", start)
+        if end < frontmatter_end and content[end + 1] in " \n":
+            return False  # value continues on the next line
+
+        line = _render_yaml_entry("source", source).rstrip("\n")
+        if "\n" in line:
+            return False
+
+        self._replace_file(memory_id, content[:start], line, content[end:])
+        return True
 
     def _read_markdown(self, memory_id: str) -> Memory | None:
         """Read memory from markdown file."""
         file_path = self._resolve_memory_path(memory_id)
-        if not file_path.exists():
+        try:
+            stat = file_path.stat()
+        except FileNotFoundError:
+            self._parse_cache.pop(memory_id, None)
             return None
 
-        content = file_path.read_text()
-        frontmatter, body = parse_frontmatter(content)
-
-        # Remove the H1 title from body if present
-        body = re.sub(r"^#\s+.*\n+", "", body)
-
-        return Memory(
-            id=frontmatter.get("id", memory_id),
-            title=frontmatter.get("title", ""),
-            tags=frontmatter.get("tags", []),
-            summary=frontmatter.get("summary", ""),
-            content=body.strip(),
-            created_at=datetime.fromisoformat(frontmatter.get("created_at", datetime.now(timezone.utc).isoformat())),
-            accessed_at=datetime.fromisoformat(frontmatter.get("accessed_at", datetime.now(timezone.utc).isoformat())),
-            access_count=frontmatter.get("access_count", 0),
-            links=frontmatter.get("links", []),
-            source=frontmatter.get("source"),
-        )
+        # Unchanged files skip the read and YAML parse
+        cached = self._parse_cache.get(memory_id)
+        if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            self._parse_cache.move_to_end(memory_id)
+            memory = cached[2]
+        else:
+            memory = self._parse_markdown(file_path, memory_id)
+            self._cache_parsed(memory_id, stat, memory)
+
+        # Callers modify the Memory they get, so hand out a copy
+        memory = replace(memory, tags=list(memory.tags), links=list(memory.links))
+        self._apply_index_stats(memory)
+        return memory
+
+    def _cache_parsed(self, memory_id: str, stat: os.stat_result, memory: Memory):
+        """Remember a parsed memory file, evicting the least recently read one."""
+        self._parse_cache[memory_id] = (stat.st_mtime_ns, stat.st_size, memory)
+        self._parse_cache.move_to_end(memory_id)
+        if len(self._parse_cache) > PARSE_CACHE_SIZE:
+            self._parse_cache.popitem(last=False)
+
+    def _parse_markdown(self, file_path: Path, memory_id: str) -> Memory:
+        """Parse a memory file, with stats as recorded in its frontmatter."""
+        frontmatter, body = parse_frontmatter(file_path.read_text())
+        return _memory_from_frontmatter(frontmatter, body, memory_id)
+
+    def _apply_index_stats(self, memory: Memory):
+        """Overlay access stats from SQLite, which is authoritative for them.
+
+        get() only records accesses in the index; the frontmatter values are
+        used as a fallback when the memory isn't indexed.
+        """
+        with self._locked() as conn:
+            row = conn.execute(
+                "SELECT accessed_at, access_count FROM memories WHERE id = ?", (memory.id,)
+            ).fetchone()
+        if row:
+            memory.accessed_at = datetime.fromisoformat(row["accessed_at"])
+            memory.access_count = row["access_count"]
 
     def store(
         self,
@@ -326,7 +784,7 @@ class MemoryStorage:
         now = datetime.now(timezone.utc)
         memory_id = self._generate_id(title)
         # Normalize and dedupe tags (duplicates after normalization would cause IntegrityError)
-        normalized_tags = list(dict.fromkeys(normalize_tag(t) for t in tags))
+        normalized_tags = normalize_tags(tags)
         # Validate links - only keep references to existing memories
         validated_links = self._validate_links(links or [])
         contracted_source = self._contract_source(source)
@@ -349,7 +807,7 @@ class MemoryStorage:
         self._write_markdown(memory)
 
         # Update SQLite index
-        with self._connect() as conn:
+        with self._transaction() as conn:
             self._insert_memory(conn, memory)
             self._save_tags(conn, memory_id, normalized_tags)
             self._save_links(conn, memory_id, validated_links)
@@ -367,48 +825,54 @@ class MemoryStorage:
         include_content: bool = False,
     ) -> list[dict]:
         """Query memories by tags. Returns list of memory dicts."""
-        normalized_tags = [normalize_tag(t) for t in tags]
-        required_tags = [normalize_tag(t) for t in (required_tags or [])]
-
-        with self._connect() as conn:
-            conn.row_factory = sqlite3.Row
+        normalized_tags = normalize_tags(tags)
+        # Deduped, since the required-tags check compares against their count
+        required_tags = normalize_tags(required_tags or [])
 
+        with self._locked() as conn:
             if not normalized_tags and not required_tags:
                 # No tags specified, return recent memories
                 rows = conn.execute("""
-                    SELECT m.*, GROUP_CONCAT(mt.tag) as tags_str
-                    FROM memories m
-                    LEFT JOIN memory_tags mt ON m.id = mt.memory_id
-                    GROUP BY m.id
-                    ORDER BY m.created_at DESC
+                    SELECT * FROM memories
+                    ORDER BY created_at DESC
                     LIMIT ?
                 """, (limit,)).fetchall()
             else:
-                all_tags = list(set(normalized_tags + required_tags))
-                placeholders = ",".join("?" * len(all_tags))
-
-                query = f"""
-                    SELECT m.*,
-                           COUNT(DISTINCT mt.tag) as tag_overlap,
-                           GROUP_CONCAT(DISTINCT mt.tag) as tags_str
+                if required_tags:
+                    # Nothing can match if a required tag isn't used at all;
+                    # that's one index probe per tag instead of the full query
+                    present = conn.execute("""
+                        SELECT COUNT(*) FROM json_each(?)
+                        WHERE EXISTS (SELECT 1 FROM memory_tags WHERE tag = value)
+                    """, (json.dumps(required_tags),)).fetchone()[0]
+                    if present < len(required_tags):
+                        return []
+
+                all_tags = list(dict.fromkeys(normalized_tags + required_tags))
+
+                # Tag lists are passed as JSON arrays so the SQL text stays the
+                # same whatever the number of tags (and its statement is cached).
+                # (memory_id, tag) is the primary key and the lists are deduped,
+                # so plain COUNT(*) counts distinct tags.
+                query = """
+                    SELECT m.*, COUNT(*) as tag_overlap
                     FROM memories m
                     JOIN memory_tags mt ON m.id = mt.memory_id
-                    WHERE mt.tag IN ({placeholders})
+                    WHERE mt.tag IN (SELECT value FROM json_each(?))
                 """
-                params = list(all_tags)
+                params = [json.dumps(all_tags)]
 
                 if required_tags:
                     # Subquery to ensure all required tags are present
-                    req_placeholders = ",".join("?" * len(required_tags))
-                    query += f"""
+                    query += """
                         AND m.id IN (
                             SELECT memory_id FROM memory_tags
-                            WHERE tag IN ({req_placeholders})
+                            WHERE tag IN (SELECT value FROM json_each(?))
                             GROUP BY memory_id
-                            HAVING COUNT(DISTINCT tag) = ?
+                            HAVING COUNT(*) = ?
                         )
                     """
-                    params.extend(required_tags)
+                    params.append(json.dumps(required_tags))
                     params.append(len(required_tags))
 
                 query += """
@@ -420,7 +884,10 @@ class MemoryStorage:
 
                 rows = conn.execute(query, params).fetchall()
 
-            return [self._row_to_result(row, include_content) for row in rows]
+            # Tags for just the returned rows, instead of GROUP_CONCAT over the join
+            tags_by_id = self._fetch_tags(conn, [row["id"] for row in rows])
+
+        return [self._row_to_result(row, tags_by_id[row["id"]], include_content) for row in rows]
 
     def get(self, memory_id: str) -> Memory | None:
         """Get a memory by ID, updating access stats."""
@@ -432,19 +899,95 @@ class MemoryStorage:
         memory.accessed_at = now
         memory.access_count += 1
 
-        # Update markdown file
-        self._write_markdown(memory)
-
-        # Update SQLite
-        with self._connect() as conn:
+        # Access stats live in SQLite only; rewriting the markdown file on every
+        # read is the most expensive part of a get(). See flush_stats_to_markdown().
+        with self._transaction() as conn:
             conn.execute("""
                 UPDATE memories
                 SET accessed_at = ?, access_count = access_count + 1
                 WHERE id = ?
             """, (now.isoformat(), memory_id))
+        self._stale_stats.add(memory_id)
 
         return memory
 
+    def _memory_file_ids(self) -> Iterator[str]:
+        """Yield the IDs of the .md files in the storage directory."""
+        # scandir entries carry the file type, so there's no stat() or Path per file
+        with os.scandir(self.base_path) as entries:
+            for entry in entries:
+                if entry.name.endswith(".md") and entry.is_file():
+                    yield entry.name[:-3]
+
+    def rebuild_index(self) -> int:
+        """Rebuild the SQLite index from the markdown files.
+
+        Files that aren't memories or fail to parse are left out and listed
+        in skipped_files. Returns the number of memories indexed.
+        """
+        # Access stats already in the index are newer than the frontmatter copies
+        with self._locked() as conn:
+            stats = {
+                row["id"]: (row["accessed_at"], row["access_count"])
+                for row in conn.execute("SELECT id, accessed_at, access_count FROM memories")
+            }
+
+        memories = []
+        skipped = []
+        for memory_id in sorted(self._memory_file_ids()):
+            try:
+                file_path = self._resolve_memory_path(memory_id)
+            except InvalidMemoryId:
+                continue  # can't be a memory file
+            # Parsed directly rather than through the parse cache, which
+            # would otherwise fill up with the whole store
+            try:
+                frontmatter, body = parse_frontmatter(file_path.read_text())
+                if _is_memory_frontmatter(frontmatter):
+                    memory = _memory_from_frontmatter(frontmatter, body, memory_id)
+                else:
+                    memory = None  # some other markdown file
+            except ValueError:
+                memory = None  # a broken file only affects itself, as it would for get()
+            if memory is None:
+                skipped.append(memory_id)
+                continue
+            memory.id = memory_id
+            memory.tags = normalize_tags(memory.tags)
+            if memory_id in stats:
+                accessed_at, memory.access_count = stats[memory_id]
+                memory.accessed_at = datetime.fromisoformat(accessed_at)
+            memories.append(memory)
+        self.skipped_files = skipped
+
+        memory_ids = {memory.id for memory in memories}
+        with self._transaction() as conn:
+            for table in ("memory_links", "memory_tags", "tag_cooccurrence", "memories"):
+                conn.execute(f"DELETE FROM {table}")
+            for memory in memories:
+                self._insert_memory(conn, memory)
+                self._save_tags(conn, memory.id, memory.tags)
+                self._save_links(conn, memory.id, [link for link in memory.links if link in memory_ids])
+                self._update_cooccurrence(conn, memory.tags)
+
+        return len(memories)
+
+    def flush_stats_to_markdown(self) -> list[str]:
+        """Write access stats from SQLite back into the markdown frontmatter.
+
+        Only memories accessed since their file was last written are flushed.
+        Returns list of memory IDs whose files were rewritten.
+        """
+        flushed_ids = []
+        for memory_id in sorted(self._stale_stats):
+            memory = self._read_markdown(memory_id)
+            if memory:
+                self._write_markdown(memory)
+                flushed_ids.append(memory_id)
+        self._stale_stats.clear()
+
+        return flushed_ids
+
     def update(
         self,
         memory_id: str,
@@ -459,14 +1002,27 @@ class MemoryStorage:
         memory = self._read_markdown(memory_id)
         if not memory:
             return None
-
-        old_tags = memory.tags
+        old_content = memory.content
+
+        # The index can differ from the file if it was edited by hand, and
+        # co-occurrence counts were built from the indexed tags
+        with self._locked() as conn:
+            old_tags = self._fetch_tags(conn, [memory_id])[memory_id]
+            row = conn.execute("SELECT title, summary, source FROM memories WHERE id = ?", (memory_id,)).fetchone()
+            indexed_fields = tuple(row) if row else None
+            indexed_links = [
+                r[0] for r in conn.execute("SELECT to_id FROM memory_links WHERE from_id = ? ORDER BY rowid", (memory_id,))
+            ]
+        # The no-op check compares against what's in the file
+        file_tags = memory.tags
+        old_links = memory.links
+        old_fields = (memory.title, memory.summary, memory.source)
 
         if title is not None:
             memory.title = title
         if tags is not None:
             # Normalize and dedupe tags
-            memory.tags = list(dict.fromkeys(normalize_tag(t) for t in tags))
+            memory.tags = normalize_tags(tags)
         if summary is not None:
             memory.summary = summary
         if content is not None:
@@ -478,24 +1034,42 @@ class MemoryStorage:
 
         memory.accessed_at = datetime.now(timezone.utc)
 
+        # Skip rewriting the file if no value actually changed
+        changed = (
+            (memory.title, memory.summary, memory.source) != old_fields
+            or memory.tags != file_tags
+            or memory.links != old_links
+        )
+        if not changed and content is not None:
+            changed = content != old_content
+
         # Write markdown first - stale files are less harmful than stale DB
         # (since get() reads from markdown, DB-only updates would be invisible)
-        self._write_markdown(memory)
-
-        # Update SQLite
-        with self._connect() as conn:
-            conn.execute("""
-                UPDATE memories
-                SET title = ?, summary = ?, source = ?, accessed_at = ?
-                WHERE id = ?
-            """, (memory.title, memory.summary, memory.source, memory.accessed_at.isoformat(), memory_id))
+        if changed:
+            self._write_markdown(memory)
+        else:
+            self._stale_stats.add(memory_id)
+
+        # Update SQLite, writing only the columns whose indexed values differ
+        with self._transaction() as conn:
+            if (memory.title, memory.summary, memory.source) != indexed_fields:
+                conn.execute("""
+                    UPDATE memories
+                    SET title = ?, summary = ?, source = ?, accessed_at = ?
+                    WHERE id = ?
+                """, (memory.title, memory.summary, memory.source, _utc_isoformat(memory.accessed_at), memory_id))
+            else:
+                conn.execute(
+                    "UPDATE memories SET accessed_at = ? WHERE id = ?",
+                    (_utc_isoformat(memory.accessed_at), memory_id),
+                )
 
-            if tags is not None:
+            if tags is not None and memory.tags != old_tags:
                 self._save_tags(conn, memory_id, memory.tags)
                 self._update_cooccurrence(conn, old_tags, delta=-1)
                 self._update_cooccurrence(conn, memory.tags, delta=1)
 
-            if links is not None:
+            if links is not None and memory.links != indexed_links:
                 self._save_links(conn, memory_id, memory.links)
 
         return memory
@@ -506,27 +1080,28 @@ class MemoryStorage:
         if not file_path.exists():
             return False
 
-        memory = self._read_markdown(memory_id)
-
         # Delete file
         file_path.unlink()
+        self._parse_cache.pop(memory_id, None)
+        self._stale_stats.discard(memory_id)
 
         # Delete from SQLite
-        with self._connect() as conn:
+        with self._transaction() as conn:
+            # Indexed tags are the ones counted in co-occurrence; read them
+            # before the rows go away
+            tags = self._fetch_tags(conn, [memory_id])[memory_id]
+
             conn.execute("DELETE FROM memories WHERE id = ?", (memory_id,))
             conn.execute("DELETE FROM memory_tags WHERE memory_id = ?", (memory_id,))
             conn.execute("DELETE FROM memory_links WHERE from_id = ? OR to_id = ?", (memory_id, memory_id))
 
-            if memory:
-                self._update_cooccurrence(conn, memory.tags, delta=-1)
+            self._update_cooccurrence(conn, tags, delta=-1)
 
         return True
 
     def get_tags(self, include_examples: bool = False, examples_per_tag: int = 2) -> list[dict]:
         """Get all tags with counts and optional examples."""
-        with self._connect() as conn:
-            conn.row_factory = sqlite3.Row
-
+        with self._locked() as conn:
             tags = conn.execute("""
                 SELECT tag, COUNT(*) as count
                 FROM memory_tags
@@ -534,47 +1109,52 @@ class MemoryStorage:
                 ORDER BY count DESC
             """).fetchall()
 
-            results = []
-            for row in tags:
-                tag_dict = {"tag": row["tag"], "count": row["count"]}
-
-                if include_examples:
-                    examples = conn.execute("""
-                        SELECT m.summary
-                        FROM memories m
-                        JOIN memory_tags mt ON m.id = mt.memory_id
-                        WHERE mt.tag = ?
-                        ORDER BY m.accessed_at DESC
-                        LIMIT ?
-                    """, (row["tag"], examples_per_tag)).fetchall()
-                    tag_dict["examples"] = [e["summary"] for e in examples]
+            results = [{"tag": row["tag"], "count": row["count"]} for row in tags]
 
-                results.append(tag_dict)
+            if include_examples:
+                # Most recently accessed summaries for every tag in one query,
+                # instead of a query per tag
+                examples = {result["tag"]: [] for result in results}
+                rows = conn.execute("""
+                    SELECT tag, summary FROM (
+                        SELECT mt.tag, m.summary, ROW_NUMBER() OVER (
+                            PARTITION BY mt.tag ORDER BY m.accessed_at DESC
+                        ) AS rank
+                        FROM memory_tags mt
+                        JOIN memories m ON m.id = mt.memory_id
+                    )
+                    WHERE rank <= ?
+                    ORDER BY tag, rank
+                """, (examples_per_tag,))
+                for row in rows:
+                    examples[row["tag"]].append(row["summary"])
+                for result in results:
+                    result["examples"] = examples[result["tag"]]
 
-            return results
+        return results
 
     def get_related_tags(self, tags: list[str], limit: int = 10) -> list[dict]:
         """Get tags that frequently co-occur with the given tags."""
-        normalized_tags = [t for t in (normalize_tag(t) for t in tags) if t]
+        normalized_tags = [t for t in normalize_tags(tags) if t]
 
         if not normalized_tags:
             return []
 
-        with self._connect() as conn:
-            # Find tags that co-occur with any of the input tags
-            placeholders = ",".join("?" * len(normalized_tags))
-
-            rows = conn.execute(f"""
+        with self._locked() as conn:
+            # Find tags that co-occur with any of the input tags; the CTE binds
+            # the input set once and is reused for every membership test
+            rows = conn.execute("""
+                WITH input(tag) AS (SELECT value FROM json_each(?))
                 SELECT
-                    CASE WHEN tag1 IN ({placeholders}) THEN tag2 ELSE tag1 END as related_tag,
+                    CASE WHEN tag1 IN input THEN tag2 ELSE tag1 END as related_tag,
                     SUM(count) as score
                 FROM tag_cooccurrence
-                WHERE tag1 IN ({placeholders}) OR tag2 IN ({placeholders})
+                WHERE tag1 IN input OR tag2 IN input
                 GROUP BY related_tag
-                HAVING related_tag NOT IN ({placeholders})
+                HAVING related_tag NOT IN input
                 ORDER BY score DESC
                 LIMIT ?
-            """, (*normalized_tags, *normalized_tags, *normalized_tags, *normalized_tags, limit)).fetchall()
+            """, (json.dumps(normalized_tags), limit)).fetchall()
 
             return [{"tag": row[0], "score": row[1]} for row in rows]
 
@@ -582,18 +1162,20 @@ class MemoryStorage:
         self,
         older_than_days: int | None = None,
         min_access_count: int | None = None,
+        limit: int = 100,
     ) -> list[dict]:
         """Get memories that might be candidates for pruning."""
-        with self._connect() as conn:
-            conn.row_factory = sqlite3.Row
-
+        with self._locked() as conn:
             conditions = []
             params = []
 
             if older_than_days is not None:
-                cutoff = datetime.now(timezone.utc).isoformat()[:10]  # Date only
-                conditions.append("DATE(created_at) < DATE(?, ?)")
-                params.extend([cutoff, f"-{older_than_days} days"])
+                # Compare against a precomputed date so the created_at index
+                # can be used; a bare date sorts before any timestamp on that
+                # day, as they're all stored in UTC
+                cutoff = (datetime.now(timezone.utc).date() - timedelta(days=older_than_days)).isoformat()
+                conditions.append("created_at < ?")
+                params.append(cutoff)
 
             if min_access_count is not None:
                 conditions.append("access_count < ?")
@@ -606,7 +1188,8 @@ class MemoryStorage:
                 FROM memories
                 WHERE {where_clause}
                 ORDER BY access_count ASC, created_at ASC
-            """, params).fetchall()
+                LIMIT ?
+            """, (*params, limit)).fetchall()
 
             return [dict(row) for row in rows]
 
@@ -617,32 +1200,36 @@ class MemoryStorage:
         """
         origin_path = str(Path(origin_path).resolve())
         prefix = origin_path + "/"
-        updated_ids = []
-
-        with self._connect() as conn:
-            # Find memories with sources that match this origin
-            rows = conn.execute(
-                "SELECT id, source FROM memories WHERE source IS NOT NULL"
-            ).fetchall()
-
-            for memory_id, source in rows:
-                if source and source.startswith(prefix):
-                    # Contract the path
-                    relative = source[len(prefix):]
-                    new_source = f"{origin_name}:{relative}"
-
-                    # Update SQLite
-                    conn.execute(
-                        "UPDATE memories SET source = ? WHERE id = ?",
-                        (new_source, memory_id)
-                    )
-
-                    # Update markdown file
-                    memory = self._read_markdown(memory_id)
-                    if memory:
-                        memory.source = new_source
-                        self._write_markdown(memory)
-
-                    updated_ids.append(memory_id)
 
-        return updated_ids
+        # Let SQLite do the prefix match (substr rather than LIKE, so
+        # '%' and '_' in paths aren't treated as wildcards)
+        with self._locked() as conn:
+            new_sources = {
+                row["id"]: f"{origin_name}:{row['source'][len(prefix):]}"
+                for row in conn.execute(
+                    "SELECT id, source FROM memories WHERE substr(source, 1, ?) = ?",
+                    (len(prefix), prefix),
+                )
+            }
+
+        # Write markdown first - stale files are less harmful than stale DB.
+        # Only the source line is rewritten; files without a single-line
+        # source entry to splice are regenerated.
+        updated = []
+        for memory_id, source in new_sources.items():
+            if not self._rewrite_source_line(memory_id, source):
+                memory = self._read_markdown(memory_id)
+                if not memory:
+                    continue
+                memory.source = source
+                self._write_markdown(memory)
+            updated.append(memory_id)
+
+        if updated:
+            with self._transaction() as conn:
+                conn.executemany(
+                    "UPDATE memories SET source = ? WHERE id = ?",
+                    [(new_sources[memory_id], memory_id) for memory_id in updated],
+                )
+
+        return updated
@@ -1,10 +1,17 @@
 """Quick test of the storage layer."""
 
+import os
 import tempfile
+import weakref
+from datetime import date, datetime, timezone
 from pathlib import Path
 
+import yaml
+
 from mcp_ltm.config import Config
-from mcp_ltm.storage import MemoryStorage, slugify, normalize_tag, InvalidMemoryId
+from mcp_ltm.storage import (
+    PARSE_CACHE_SIZE, MemoryStorage, slugify, normalize_tag, parse_frontmatter, render_frontmatter, InvalidMemoryId,
+)
 
 
 def test_slugify():
@@ -19,6 +26,35 @@ def test_normalize_tag():
     assert normalize_tag("  python  ") == "python"
 
 
+def test_parse_frontmatter():
+    frontmatter, body = parse_frontmatter("---\nid: x\nsummary: a---b\n---\n\n# Title\n\nBody")
+    assert frontmatter == {"id": "x", "summary": "a---b"}
+    assert body == "# Title\n\nBody"
+    assert parse_frontmatter("No frontmatter") == ({}, "No frontmatter")
+    assert parse_frontmatter("---\nunterminated") == ({}, "---\nunterminated")
+
+
+def test_parse_frontmatter_matches_yaml():
+    """The fast frontmatter writer and parser must agree with PyYAML."""
+    samples = [
+        {"id": "a", "title": "Pytest's -x Flag: Stop!", "tags": ["python", "type:insight"],
+         "summary": "A long summary " * 10, "access_count": 3, "links": [], "source": "proj:docs/a.md"},
+        {"title": "yes", "summary": "123", "tags": [], "links": ["a", "b"]},
+        {"title": "Line one\n\nLine three", "summary": " padded ", "source": None},
+        {"title": "café 日本", "summary": "#not a comment", "tags": ["007", "null", "a: b"]},
+    ]
+    for metadata in samples:
+        rendered = render_frontmatter(metadata)
+        assert yaml.safe_load(rendered.removeprefix("---\n").removesuffix("---\n\n")) == metadata
+        frontmatter, body = parse_frontmatter(rendered + "Body")
+        assert frontmatter == metadata
+        assert body == "Body"
+
+    hand_written = "---\ntitle: Plain title\ncreated_at: 2024-01-01\nweight: 1.5\n---\nBody"
+    frontmatter, _ = parse_frontmatter(hand_written)
+    assert frontmatter == yaml.safe_load("title: Plain title\ncreated_at: 2024-01-01\nweight: 1.5")
+
+
 def test_store_and_retrieve():
     with tempfile.TemporaryDirectory() as tmpdir:
         storage = MemoryStorage(Path(tmpdir))
@@ -52,6 +88,212 @@ def test_store_and_retrieve():
         assert "python" in tag_names
 
 
+def test_get_tags_examples():
+    """Test that tag examples are the most recently accessed summaries."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        storage = MemoryStorage(Path(tmpdir))
+        ids = [
+            storage.store(title=f"Memory {i}", tags=["python"], summary=f"Summary {i}", content="Content")[0]
+            for i in range(3)
+        ]
+        storage.store(title="Other", tags=["rust"], summary="Rust summary", content="Content")
+        storage.get(ids[0])
+
+        tags = {t["tag"]: t for t in storage.get_tags(include_examples=True)}
+        assert tags["python"]["count"] == 3
+        assert tags["python"]["examples"] == ["Summary 0", "Summary 2"]
+        assert tags["rust"]["examples"] == ["Rust summary"]
+
+
+def test_access_stats_kept_in_index():
+    """Test that get() records access stats without rewriting the file."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        storage = MemoryStorage(Path(tmpdir))
+        memory_id, _ = storage.store(
+            title="Frequently Read",
+            tags=["test"],
+            summary="Test",
+            content="Content",
+        )
+        md_path = Path(tmpdir) / f"{memory_id}.md"
+        original = md_path.read_text()
+
+        storage.get(memory_id)
+        assert storage.get(memory_id).access_count == 2
+        assert md_path.read_text() == original
+
+        # Flushing brings the frontmatter up to date, once
+        assert storage.flush_stats_to_markdown() == [memory_id]
+        assert "access_count: 2" in md_path.read_text()
+        assert storage.flush_stats_to_markdown() == []
+
+        # Closing the storage flushes as well, so a rebuild keeps the stats
+        storage.get(memory_id)
+        storage.close()
+        assert "access_count: 3" in md_path.read_text()
+
+
+def test_crash_before_close_loses_only_stats():
+    """Test that skipping close() only loses the access stats on rebuild."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        storage = MemoryStorage(Path(tmpdir))
+        memory_id, _ = storage.store(title="Crashed", tags=["python"], summary="Old", content="Content")
+        storage.get(memory_id)
+        storage.update(memory_id, summary="New", content="Edited")
+        storage.get(memory_id)
+        storage.get(memory_id)
+
+        # Simulate a crash: no flush, and the index is lost
+        storage._conn.close()
+        for path in Path(tmpdir).glob("index.db*"):
+            path.unlink()
+
+        storage = MemoryStorage(Path(tmpdir))
+        memory = storage.get(memory_id)
+        assert (memory.summary, memory.content, memory.tags) == ("New", "Edited", ["python"])
+        # The access recorded by the update's write survives, plus this get();
+        # the two after it are lost
+        assert memory.access_count == 2
+
+
+def test_flush_rewrites_only_accessed_files():
+    """Test that flushing stats skips memories not read since their last write."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        storage = MemoryStorage(Path(tmpdir))
+        read_id, _ = storage.store(title="Read", tags=["test"], summary="Test", content="Content")
+        storage.store(title="Unread", tags=["test"], summary="Test", content="Content")
+        storage.get(read_id)
+        assert storage.flush_stats_to_markdown() == [read_id]
+
+        # A write brings the file's stats up to date by itself
+        storage.get(read_id)
+        storage.update(read_id, content="Changed")
+        assert storage.flush_stats_to_markdown() == []
+
+
+def test_reopen_storage():
+    """Test that data written through one connection is visible after reopening."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        storage = MemoryStorage(Path(tmpdir))
+        memory_id, _ = storage.store(
+            title="Persistent Memory",
+            tags=["python"],
+            summary="Survives reopening",
+            content="Content",
+        )
+        storage.close()
+
+        reopened = MemoryStorage(Path(tmpdir))
+        results = reopened.query(tags=["python"])
+        assert [r["id"] for r in results] == [memory_id]
+        reopened.close()
+
+
+def test_get_rereads_changed_files():
+    """Test that cached parses are dropped when the file changes."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        storage = MemoryStorage(Path(tmpdir))
+        memory_id, _ = storage.store(title="Memory", tags=["test"], summary="Test", content="Original")
+
+        memory = storage.get(memory_id)
+        memory.tags.append("mutated")
+        assert storage.get(memory_id).tags == ["test"]
+
+        file_path = Path(tmpdir) / f"{memory_id}.md"
+        file_path.write_text(file_path.read_text().replace("Original", "Edited by hand"))
+        assert storage.get(memory_id).content == "Edited by hand"
+
+        # Empty list entries load as null in YAML
+        file_path.write_text(file_path.read_text().replace("tags:\n- test", "tags:").replace("links: []", "links:"))
+        memory = storage.get(memory_id)
+        assert memory.tags == []
+        assert memory.links == []
+
+
+def test_parse_cache_is_bounded():
+    """Test that the parse cache keeps only the most recently read memories."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        storage = MemoryStorage(Path(tmpdir))
+        ids = [
+            storage.store(title=f"Memory {i}", tags=["test"], summary="Test", content="Content")[0]
+            for i in range(PARSE_CACHE_SIZE + 2)
+        ]
+        for memory_id in ids:
+            storage.get(memory_id)
+        storage.get(ids[2])
+
+        assert len(storage._parse_cache) == PARSE_CACHE_SIZE
+        assert ids[0] not in storage._parse_cache
+        assert next(reversed(storage._parse_cache)) == ids[2]
+
+
+def test_rebuild_index_from_markdown():
+    """Test that a missing index is rebuilt from the markdown files."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        storage = MemoryStorage(Path(tmpdir))
+        id1, _ = storage.store(title="First", tags=["python", "testing"], summary="One", content="Content")
+        id2, _ = storage.store(title="Second", tags=["python"], summary="Two", content="Content", links=[id1])
+        storage.get(id1)
+        storage.flush_stats_to_markdown()
+        storage.close()
+
+        (Path(tmpdir) / "index.db").unlink()
+        storage = MemoryStorage(Path(tmpdir))
+
+        results = storage.query(tags=["python"])
+        assert {r["id"] for r in results} == {id1, id2}
+        assert storage.get(id2).links == [id1]
+        assert storage.get(id1).access_count == 2
+        assert storage.get_related_tags(["python"]) == [{"tag": "testing", "score": 1}]
+        assert storage.rebuild_index() == 2
+
+
+def test_rebuild_index_skips_broken_files():
+    """Test that malformed markdown files don't stop the index rebuild."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        storage = MemoryStorage(Path(tmpdir))
+        good_id, _ = storage.store(title="Good", tags=["python"], summary="Good", content="Content")
+        storage.close()
+
+        header = "---\nid: x\ntitle: X\ncreated_at: '2024-01-01T00:00:00+00:00'\n"
+        (Path(tmpdir) / "broken.md").write_text(header + "summary: [unclosed\n---\n\nBody")
+        (Path(tmpdir) / "bad-date.md").write_text(header.replace("'2024-01-01T00:00:00+00:00'", "yesterday") + "---\n\nBody")
+        (Path(tmpdir) / "int-tag.md").write_text(header + "tags:\n- 2024\n---\n\nBody")
+        (Path(tmpdir) / "list.md").write_text("---\n- not a mapping\n---\n\nBody")
+        (Path(tmpdir) / "notes.md").write_text("# Notes that aren't a memory\n")
+        (Path(tmpdir) / "stray.md").write_text("---\ntitle: Stray\n---\n\nBody")
+        (Path(tmpdir) / "no-tags.md").write_text(header + "tags:\nlinks:\n---\n\nBody")
+        (Path(tmpdir) / "index.db").unlink()
+
+        storage = MemoryStorage(Path(tmpdir))
+        assert [r["id"] for r in storage.query(tags=["python"])] == [good_id]
+        assert storage.get("no-tags").tags == []
+        assert storage.skipped_files == ["bad-date", "broken", "int-tag", "list", "notes", "stray"]
+        assert storage.rebuild_index() == 2
+
+        # Rebuilding a live index keeps the stats it recorded
+        storage.get(good_id)
+        assert storage.rebuild_index() == 2
+        assert storage.get(good_id).access_count == 2
+
+
+def test_duplicate_titles_get_unique_ids():
+    """Test that repeated titles get numbered IDs."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        storage = MemoryStorage(Path(tmpdir))
+
+        ids = [
+            storage.store(title="Same Title", tags=["test"], summary="Test", content="Content")[0]
+            for _ in range(3)
+        ]
+        assert ids == ["same-title", "same-title-2", "same-title-3"]
+
+        # A file without an index entry still blocks its ID
+        (Path(tmpdir) / "same-title-4.md").write_text("orphan")
+        memory_id, _ = storage.store(title="Same Title", tags=["test"], summary="Test", content="Content")
+        assert memory_id == "same-title-5"
+
+
 def test_tag_cooccurrence():
     with tempfile.TemporaryDirectory() as tmpdir:
         storage = MemoryStorage(Path(tmpdir))
@@ -98,6 +340,14 @@ def test_required_tags():
         results = storage.query(tags=["python"], required_tags=["type:insight"])
         assert len(results) == 1
         assert results[0]["title"] == "Python Testing"
+        assert results[0]["tags"] == ["python", "testing", "type:insight"]
+
+        # Repeating a required tag doesn't change the result
+        results = storage.query(tags=[], required_tags=["python", "Python"])
+        assert len(results) == 2
+
+        # A required tag no memory has matches nothing
+        assert storage.query(tags=["python"], required_tags=["python", "missing"]) == []
 
 
 def test_links():
@@ -180,6 +430,189 @@ def test_config_origins():
         assert "hwif" not in config2.origins
 
 
+def test_config_empty_origins_entry():
+    """Test that an empty 'origins:' entry loads as no origins."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config_path = Path(tmpdir) / "config.yaml"
+        config_path.write_text("origins:\nother: kept\n")
+
+        config = Config(config_path)
+        assert config.origins == {}
+        config.add_origin("project", "/Users/test/project")
+        assert config.contract_path("/Users/test/project/file.md") == "project:file.md"
+
+        # Unrelated keys survive a save
+        assert "other: kept" in config_path.read_text()
+
+
+def test_nested_origins_prefer_longest():
+    """Test that the most specific origin wins when origins are nested."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config = Config(Path(tmpdir) / "config.yaml")
+        config.add_origin("home", "/Users/test")
+        config.add_origin("project", "/Users/test/project")
+
+        assert config.contract_path("/Users/test/project/docs/file.md") == "project:docs/file.md"
+        assert config.contract_path("/Users/test/notes/file.md") == "home:notes/file.md"
+        assert config.contract_path("/Users/other/file.md") == "/Users/other/file.md"
+        assert config.contract_path("/Users/test/project/./docs//file.md") == "project:docs/file.md"
+        assert config.contract_path("/Users/test/project/../notes/file.md") == "home:notes/file.md"
+
+        # Removing the nested origin falls back to the outer one
+        config.remove_origin("project")
+        assert config.contract_path("/Users/test/project/docs/file.md") == "home:project/docs/file.md"
+
+
+def test_contract_path_through_symlink():
+    """Test that a path through a symlink contracts to the resolved origin."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        real = Path(tmpdir) / "real"
+        (real / "proj").mkdir(parents=True)
+        link = Path(tmpdir) / "link"
+        link.symlink_to(real)
+
+        config = Config(Path(tmpdir) / "config.yaml")
+        config.add_origin("p", str(link / "proj"))
+
+        assert config.contract_path(str(link / "proj" / "a.md")) == "p:a.md"
+        assert config.contract_path(str(real / "proj" / "a.md")) == "p:a.md"
+
+
+def test_contract_path_symlink_into_nested_origin():
+    """Test that a symlink into a nested origin contracts to the nested one."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        outer = Path(tmpdir).resolve() / "outer"
+        (outer / "inner").mkdir(parents=True)
+        (outer / "link").symlink_to(outer / "inner")
+
+        config = Config(Path(tmpdir) / "config.yaml")
+        config.add_origin("outer", str(outer))
+        config.add_origin("inner", str(outer / "inner"))
+
+        assert config.contract_path(str(outer / "link" / "a.md")) == "inner:a.md"
+        assert config.contract_path(str(outer / "other" / "a.md")) == "outer:other/a.md"
+        assert config.contract_path(str(outer / "inner" / "a.md")) == "inner:a.md"
+
+
+def test_contract_path_follows_symlink_changes():
+    """Test that resolved paths aren't memoized past a symlink change."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name in ("one", "two"):
+            (Path(tmpdir) / name).mkdir()
+        link = Path(tmpdir) / "link"
+        link.symlink_to(Path(tmpdir) / "one")
+
+        config = Config(Path(tmpdir) / "config.yaml")
+        config.add_origin("one", str(Path(tmpdir) / "one"))
+        config.add_origin("two", str(Path(tmpdir) / "two"))
+        assert config.contract_path(str(link / "a.md")) == "one:a.md"
+
+        link.unlink()
+        link.symlink_to(Path(tmpdir) / "two")
+        assert config.contract_path(str(link / "a.md")) == "two:a.md"
+
+
+def test_config_freed_without_gc():
+    """Test that the path caches don't keep a Config alive in a reference cycle."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config = Config(Path(tmpdir) / "config.yaml")
+        config.add_origin("project", "/Users/test/project")
+        config.contract_path("/Users/test/project/file.md")
+        config.expand_path("project:file.md")
+
+        ref = weakref.ref(config)
+        del config
+        assert ref() is None
+
+
+def test_many_origins_use_trie():
+    """Test that contraction with many origins matches the linear scan."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config = Config(Path(tmpdir) / "config.yaml")
+        with config.batch():
+            for i in range(10):
+                config.add_origin(f"project{i}", f"/Users/test/project{i}")
+            config.add_origin("nested", "/Users/test/project3/sub")
+            config.add_origin("home", "/Users/test")
+
+        assert config._origin_trie is not None
+        assert config.contract_path("/Users/test/project3/sub/file.md") == "nested:file.md"
+        assert config.contract_path("/Users/test/project3/other.md") == "project3:other.md"
+        assert config.contract_path("/Users/test/project30/file.md") == "home:project30/file.md"
+        assert config.contract_path("/Users/test/project3") == "home:project3"
+        assert config.contract_path("/Users/other/file.md") == "/Users/other/file.md"
+
+
+def test_config_reloads_when_file_changes():
+    """Test that a Config picks up changes written by another instance."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config_path = Path(tmpdir) / "config.yaml"
+        reader = Config(config_path)
+        writer = Config(config_path)
+        assert reader.origins == {}
+
+        writer.add_origin("project", "/Users/test/project")
+        assert reader.origins == {"project": "/Users/test/project"}
+        assert reader.contract_path("/Users/test/project/file.md") == "project:file.md"
+
+        # Instances don't share mutable state
+        reader.origins["other"] = "/tmp"
+        assert "other" not in Config(config_path).origins
+
+
+def test_config_reloads_same_mtime_edits():
+    """Test that a rewrite keeping the file's mtime is still picked up."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config_path = Path(tmpdir) / "config.yaml"
+        writer = Config(config_path)
+        writer.add_origin("project", "/Users/test/project")
+        reader = Config(config_path)
+        assert set(reader.origins) == {"project"}
+
+        stat = config_path.stat()
+        writer.add_origin("other", "/Users/test/other")
+        os.utime(config_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        assert set(reader.origins) == {"project", "other"}
+
+
+def test_config_batch_ignores_outside_edits():
+    """Test that an outside edit during batch() doesn't discard pending changes."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config_path = Path(tmpdir) / "config.yaml"
+        config = Config(config_path)
+        other = Config(config_path)
+
+        with config.batch():
+            config.add_origin("one", "/Users/test/one")
+            other.add_origin("two", "/Users/test/two")
+            assert config.contract_path("/Users/test/one/file.md") == "one:file.md"
+            assert set(config.origins) == {"one"}
+
+        assert set(Config(config_path).origins) == {"one"}
+
+
+def test_config_batch_defers_save():
+    """Test that changes inside batch() are written once on exit."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config_path = Path(tmpdir) / "config.yaml"
+        config = Config(config_path)
+
+        with config.batch():
+            config.add_origin("one", "/Users/test/one")
+            with config.batch():
+                config.add_origin("two", "/Users/test/two")
+            assert not config_path.exists()
+            assert config.contract_path("/Users/test/two/file.md") == "two:file.md"
+
+        assert config_path.exists()
+        assert set(Config(config_path).origins) == {"one", "two"}
+
+        # Re-adding an unchanged origin doesn't rewrite the file
+        mtime = config_path.stat().st_mtime_ns
+        config.add_origin("one", "/Users/test/one")
+        assert config_path.stat().st_mtime_ns == mtime
+
+
 def test_source_with_config():
     """Test source field with origin configuration."""
     with tempfile.TemporaryDirectory() as tmpdir:
@@ -234,6 +667,111 @@ def test_update_source():
         assert memory.source == "/path/to/source.md"
 
 
+def test_update_keeps_unchanged_fields():
+    """Test that a partial update keeps the fields it doesn't touch."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        storage = MemoryStorage(Path(tmpdir))
+
+        other_id, _ = storage.store(title="Other", tags=["x"], summary="Other", content="Other")
+        memory_id, _ = storage.store(
+            title="Memory",
+            tags=["a", "b"],
+            summary="Test",
+            content="Body text",
+            links=[other_id],
+        )
+        created_at = storage.get(memory_id).created_at
+
+        storage.update(memory_id, title="Renamed")
+        memory = storage.get(memory_id)
+        assert memory.title == "Renamed"
+        assert memory.content == "Body text"
+        assert memory.tags == ["a", "b"]
+        assert memory.links == [other_id]
+        assert memory.created_at == created_at
+
+        storage.update(memory_id, tags=["a", "c"])
+        related = {r["tag"] for r in storage.get_related_tags(["a"])}
+        assert related == {"c"}
+
+
+def test_update_keeps_hand_edits():
+    """Test that update() starts from the file, including edits made by hand."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        storage = MemoryStorage(Path(tmpdir))
+        memory_id, _ = storage.store(title="Memory", tags=["test"], summary="Original", content="Body")
+
+        file_path = Path(tmpdir) / f"{memory_id}.md"
+        text = file_path.read_text()
+        file_path.write_text(text.replace("title: Memory", "title: Edited").replace("summary: Original", "summary: Edited"))
+
+        storage.update(memory_id, content="New body")
+        memory = storage.get(memory_id)
+        assert memory.title == "Edited"
+        assert memory.summary == "Edited"
+        assert memory.content == "New body"
+
+        # Setting a field back to its indexed value still rewrites the file
+        file_path.write_text(file_path.read_text().replace("- test", "- hand-tag"))
+        storage.update(memory_id, tags=["test"])
+        assert storage.get(memory_id).tags == ["test"]
+        storage.update(memory_id, summary="Original")
+        assert storage.get(memory_id).summary == "Original"
+
+
+def test_written_memories_are_cached_as_parsed():
+    """Test that a write caches the memory exactly as its file parses back."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        storage = MemoryStorage(Path(tmpdir))
+        cases = [
+            ("Plain", "Body"),
+            ("Title: with 'quotes'", "  padded body\n\n"),
+            ("Multi\nline", "# Heading in body\nText"),
+            ("2024", "\n\nleading blank lines"),
+        ]
+        for title, content in cases:
+            memory_id, _ = storage.store(
+                title=title, tags=["x", "two words"], summary="yes", content=content, source="/a: b"
+            )
+            cached = storage._parse_cache[memory_id][2]
+            assert cached == storage._parse_markdown(Path(tmpdir) / f"{memory_id}.md", memory_id)
+
+        # Updating right after a write doesn't parse the file again
+        def fail(*args):
+            raise AssertionError("file was parsed")
+
+        storage._parse_markdown = fail
+        storage.update(memory_id, summary="Changed")
+        storage.update(memory_id, content="Changed too")
+        assert storage.get(memory_id).summary == "Changed"
+
+
+def test_noop_update_skips_write():
+    """Test that an update that changes nothing leaves the file alone."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        storage = MemoryStorage(Path(tmpdir))
+        memory_id, _ = storage.store(title="Memory", tags=["a", "b"], summary="Test", content="Body")
+        file_path = Path(tmpdir) / f"{memory_id}.md"
+        before = file_path.read_text()
+        mtime = file_path.stat().st_mtime_ns
+
+        # Count index writes other than the access time
+        storage._conn.execute("CREATE TEMP TABLE writes (n)")
+        storage._conn.execute("""
+            CREATE TEMP TRIGGER count_writes AFTER UPDATE OF title, summary, source ON memories
+            BEGIN INSERT INTO writes VALUES (1); END
+        """)
+
+        memory = storage.update(memory_id, title="Memory", tags=["A", "b"], content="Body")
+        assert memory.title == "Memory"
+        assert file_path.stat().st_mtime_ns == mtime
+        assert file_path.read_text() == before
+        assert storage._conn.execute("SELECT COUNT(*) FROM writes").fetchone()[0] == 0
+
+        storage.update(memory_id, content="New body")
+        assert storage.get(memory_id).content == "New body"
+
+
 def test_link_validation():
     """Test that invalid links are filtered out."""
     with tempfile.TemporaryDirectory() as tmpdir:
@@ -337,6 +875,46 @@ def test_duplicate_tags_deduped():
         assert memory.tags == ["new", "tag"]
 
 
+def test_get_stale_memories():
+    """Test the age cutoff and limit for pruning candidates."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        storage = MemoryStorage(Path(tmpdir))
+
+        for i in range(3):
+            storage.store(title=f"Old {i}", tags=["test"], summary="Old", content="Content")
+        storage.store(title="New", tags=["test"], summary="New", content="Content")
+        storage._conn.execute(
+            "UPDATE memories SET created_at = '2020-01-01T12:00:00+00:00' WHERE id LIKE 'old-%'"
+        )
+
+        stale = storage.get_stale_memories(older_than_days=30)
+        assert {m["id"] for m in stale} == {"old-0", "old-1", "old-2"}
+
+        assert len(storage.get_stale_memories(older_than_days=30, limit=2)) == 2
+        assert len(storage.get_stale_memories()) == 4
+
+
+def test_stale_cutoff_uses_utc():
+    """Test that the age cutoff compares timestamps with other offsets in UTC."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # 01:00 at +05:00 is still the day before in UTC
+        (Path(tmpdir) / "east.md").write_text(
+            "---\nid: east\ntitle: East\ncreated_at: '2024-01-02T01:00:00+05:00'\n---\n\nBody"
+        )
+        storage = MemoryStorage(Path(tmpdir))
+        days = (datetime.now(timezone.utc).date() - date(2024, 1, 2)).days
+        assert [m["id"] for m in storage.get_stale_memories(older_than_days=days)] == ["east"]
+        assert storage.get_stale_memories(older_than_days=days + 1) == []
+
+        # Indexes from before timestamps were stored in UTC are converted
+        storage._conn.execute("UPDATE memories SET created_at = '2024-01-02T01:00:00+05:00'")
+        storage._conn.execute("PRAGMA user_version = 1")
+        storage.close()
+        storage = MemoryStorage(Path(tmpdir))
+        assert [m["id"] for m in storage.get_stale_memories(older_than_days=days)] == ["east"]
+        assert storage.get("east").created_at == datetime(2024, 1, 1, 20, tzinfo=timezone.utc)
+
+
 def test_path_traversal_rejected():
     """Test that path traversal attempts are rejected."""
     with tempfile.TemporaryDirectory() as tmpdir:
@@ -359,6 +937,7 @@ def test_path_traversal_rejected():
             "has spaces",
             "has.dot",
             "has/slash",
+            "trailing-newline\n",
         ]
 
         for bad_id in traversal_ids:
@@ -425,6 +1004,8 @@ def test_retroactive_origin_contraction():
             source="/Users/test/other/file3.md",
         )
 
+        md1_before = (memory_path / "memory-one.md").read_text()
+
         # Now add an origin
         config.add_origin("project", "/Users/test/project")
         updated = storage.contract_sources_for_origin("project", "/Users/test/project")
@@ -438,6 +1019,8 @@ def test_retroactive_origin_contraction():
         # Check the stored format
         md1 = (memory_path / "memory-one.md").read_text()
         assert "source: project:docs/file1.md" in md1
+        # Only the source line is rewritten
+        assert md1 == md1_before.replace("/Users/test/project/docs/file1.md", "project:docs/file1.md")
 
         md2 = (memory_path / "memory-two.md").read_text()
         assert "source: project:research/file2.md" in md2
@@ -446,22 +1029,65 @@ def test_retroactive_origin_contraction():
         md3 = (memory_path / "memory-three.md").read_text()
         assert "source: /Users/test/other/file3.md" in md3
 
+        # A memory whose file is gone keeps its indexed source
+        storage.store(
+            title="Memory Four",
+            tags=["test"],
+            summary="Fourth",
+            content="Content",
+            source="/Users/test/other/file4.md",
+        )
+        (memory_path / "memory-four.md").unlink()
+        assert storage.contract_sources_for_origin("other", "/Users/test/other") == ["memory-three"]
+        results = storage.query(tags=["test"], limit=10)
+        sources = {r["id"]: r.get("source") for r in results}
+        assert sources["memory-four"] == "/Users/test/other/file4.md"
+
 
 if __name__ == "__main__":
     test_slugify()
     test_normalize_tag()
+    test_parse_frontmatter()
+    test_parse_frontmatter_matches_yaml()
     test_store_and_retrieve()
+    test_get_tags_examples()
+    test_access_stats_kept_in_index()
+    test_crash_before_close_loses_only_stats()
+    test_flush_rewrites_only_accessed_files()
+    test_reopen_storage()
+    test_get_rereads_changed_files()
+    test_parse_cache_is_bounded()
+    test_rebuild_index_from_markdown()
+    test_rebuild_index_skips_broken_files()
+    test_duplicate_titles_get_unique_ids()
     test_tag_cooccurrence()
     test_required_tags()
     test_links()
     test_source_without_config()
     test_config_origins()
+    test_config_empty_origins_entry()
+    test_nested_origins_prefer_longest()
+    test_contract_path_through_symlink()
+    test_contract_path_symlink_into_nested_origin()
+    test_contract_path_follows_symlink_changes()
+    test_config_freed_without_gc()
+    test_many_origins_use_trie()
+    test_config_reloads_when_file_changes()
+    test_config_reloads_same_mtime_edits()
+    test_config_batch_ignores_outside_edits()
+    test_config_batch_defers_save()
     test_source_with_config()
     test_update_source()
+    test_update_keeps_unchanged_fields()
+    test_update_keeps_hand_edits()
+    test_written_memories_are_cached_as_parsed()
+    test_noop_update_skips_write()
     test_link_validation()
     test_cooccurrence_cleanup()
     test_get_related_tags_empty_input()
     test_duplicate_tags_deduped()
+    test_get_stale_memories()
+    test_stale_cutoff_uses_utc()
     test_path_traversal_rejected()
     test_retroactive_origin_contraction()
     print("All tests passed!")